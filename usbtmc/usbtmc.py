@@ -26,6 +26,9 @@ THE SOFTWARE.
 
 import usb.core
 import usb.util
+import array
+import functools
+import logging
 import struct
 import time
 import os
@@ -70,18 +73,91 @@ USB488_LOCAL_LOCKOUT    = 162
 
 USBTMC_HEADER_SIZE = 12
 
+# precompiled bulk transfer header formats; the format strings are parsed
+# once here instead of on every packet
+_bulk_out_header = struct.Struct('BBBx')
+_dev_dep_msg_out_header = struct.Struct('<BBBxLBxxx')
+_dev_dep_msg_in_header = struct.Struct('<BBBxLBBxx')
+_vendor_specific_header = struct.Struct('<BBBxLxxxx')
+_dev_dep_resp_header = struct.Struct('<BBBxLBxxx')
+
+# GET_CAPABILITIES response (USBTMC table 37 / USB488 table 8): status,
+# bcdUSBTMC, interface and device capabilities, then the USB488 fields
+_capabilities_response = struct.Struct('<BxHBB6xHBB8x')
+
+# alignment padding to the next 4-byte boundary, indexed by size & 3
+_pad_len = (0, 3, 2, 1)
+_pad_bytes = (b'', b'\x00\x00\x00', b'\x00\x00', b'\x00')
+
+# bulk OUT headers precomputed per message ID for all 255 btag values;
+# built lazily on first use of each message ID
+_bulk_out_header_table = {}
+
+
+def _pack_bulk_out_header(msgid, btag):
+    "Look up a precomputed 4-byte bulk OUT header"
+    try:
+        table = _bulk_out_header_table[msgid]
+    except KeyError:
+        table = _bulk_out_header_table.setdefault(msgid,
+            tuple(_bulk_out_header.pack(msgid, b, ~b & 0xFF) for b in range(256)))
+    return table[btag]
+
 RIGOL_QUIRK_PIDS = [0x04ce, 0x0588]
 
+# evaluated once; os.name cannot change at runtime
+_os_is_posix = (os.name == 'posix')
+
+# monotonic clock where available (Python 3.3+), wall clock otherwise
+_monotonic = getattr(time, 'monotonic', time.time)
+
+_logger = logging.getLogger(__name__)
+
+# class control request types used throughout the module, computed once
+_bmreq_in_class_interface = usb.util.build_request_type(
+    usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE)
+_bmreq_in_class_endpoint = usb.util.build_request_type(
+    usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_ENDPOINT)
+
+# Agilent U27xx firmware handoff sequences as (wIndex, wLength) pairs for
+# the vendor IN requests; only the third index differs between families
+_u27xx_init_2818 = ((0x047E, 0x0001), (0x047D, 0x0006), (0x0484, 0x0005),
+                    (0x0472, 0x000C), (0x047A, 0x0001))
+_u27xx_init_4x18 = ((0x047E, 0x0001), (0x047D, 0x0006), (0x0487, 0x0005),
+                    (0x0472, 0x000C), (0x047A, 0x0001))
+
+
+# valid resource strings:
+# USB::1234::5678::INSTR
+# USB::1234::5678::SERIAL::INSTR
+# USB0::0x1234::0x5678::INSTR
+# USB0::0x1234::0x5678::SERIAL::INSTR
+_visa_resource_re = re.compile(r'^(?P<prefix>(?P<type>USB)\d*)(::(?P<arg1>[^\s:]+))'
+    r'(::(?P<arg2>[^\s:]+(\[.+\])?))(::(?P<arg3>[^\s:]+))?'
+    r'(::(?P<suffix>INSTR))$', re.I)
+
+# keyword argument to attribute mapping for Instrument.__init__
+_init_kwarg_attrs = {
+    'idVendor': 'idVendor',
+    'idProduct': 'idProduct',
+    'iSerial': 'iSerial',
+    'device': 'device',
+    'dev': 'device',
+    'term_char': 'term_char',
+    'max_transfer_size': 'max_transfer_size',
+}
+
+
+def _endpoint_matcher(ep_dir, ep_type):
+    "Build a find_descriptor custom_match for endpoint direction and type"
+    def match(ep):
+        return (usb.util.endpoint_direction(ep.bEndpointAddress) == ep_dir and
+                usb.util.endpoint_type(ep.bmAttributes) == ep_type)
+    return match
+
 
 def parse_visa_resource_string(resource_string):
-    # valid resource strings:
-    # USB::1234::5678::INSTR
-    # USB::1234::5678::SERIAL::INSTR
-    # USB0::0x1234::0x5678::INSTR
-    # USB0::0x1234::0x5678::SERIAL::INSTR
-    m = re.match('^(?P<prefix>(?P<type>USB)\d*)(::(?P<arg1>[^\s:]+))'
-        '(::(?P<arg2>[^\s:]+(\[.+\])?))(::(?P<arg3>[^\s:]+))?'
-        '(::(?P<suffix>INSTR))$', resource_string, re.I)
+    m = _visa_resource_re.match(resource_string)
 
     if m is not None:
         return dict(
@@ -120,32 +196,93 @@ class UsbtmcException(Exception):
         return self.msg
 
 
-def list_devices():
+# serial number, capability and interface-class caches, keyed by physical
+# device, so that repeated enumeration and reopening do not repeat slow
+# control transfers and descriptor walks
+_serial_number_cache = {}
+_capabilities_cache = {}
+_usbtmc_class_cache = {}
+
+
+def _device_key(dev):
+    "Key that identifies a physical device across Instrument instances"
+    return (dev.bus, dev.address, dev.idVendor, dev.idProduct)
+
+
+def _read_serial_number(dev):
+    "Read device serial number, caching the result"
+    key = _device_key(dev)
+
+    if key in _serial_number_cache:
+        return _serial_number_cache[key]
+
+    iSerial = None
+    try:
+        iSerial = dev.serial_number
+    except (usb.core.USBError, ValueError):
+        # failures are cached as None so unresponsive devices are not
+        # probed again on every call
+        pass
+
+    _serial_number_cache[key] = iSerial
+
+    return iSerial
+
+
+# cached result of the last full bus enumeration; a short TTL keeps
+# back-to-back Instrument constructions from walking the bus repeatedly
+# while still noticing hot-plugged devices quickly
+_device_list_cache = {'ts': 0.0, 'devs': None}
+_device_list_ttl = 2.0
+
+
+def list_devices(force_refresh=False):
     "List all connected USBTMC devices"
 
+    if not force_refresh:
+        devs = _device_list_cache['devs']
+        if devs is not None and _monotonic() - _device_list_cache['ts'] < _device_list_ttl:
+            return list(devs)
+
     def is_usbtmc_device(dev):
-        for cfg in dev:
-            d = usb.util.find_descriptor(cfg, bInterfaceClass=USBTMC_bInterfaceClass,
-                                         bInterfaceSubClass=USBTMC_bInterfaceSubClass)
-            if d is not None:
-                return True
+        # descriptor walks can trigger control transfers on some backends,
+        # so remember the verdict for each physical device
+        key = _device_key(dev)
+        if key in _usbtmc_class_cache:
+            return _usbtmc_class_cache[key]
 
-            if dev.idVendor == 0x1334:
-                # Advantest
-                return True
+        result = _check_usbtmc_device(dev)
+        _usbtmc_class_cache[key] = result
+
+        return result
+
+    devs = list(usb.core.find(find_all=True, custom_match=is_usbtmc_device))
+    _device_list_cache['devs'] = devs
+    _device_list_cache['ts'] = _monotonic()
+
+    return list(devs)
 
-            if dev.idVendor == 0x0957:
-                # Agilent
-                if dev.idProduct in [0x2818, 0x4218, 0x4418]:
-                    # Agilent U27xx modular devices in firmware update mode
-                    # 0x2818 for U2701A/U2702A (firmware update mode on power up)
-                    # 0x4218 for U2722A (firmware update mode on power up)
-                    # 0x4418 for U2723A (firmware update mode on power up)
-                    return True
 
-        return False
+def _check_usbtmc_device(dev):
+    "Check if a device advertises a USBTMC interface or a known quirk"
 
-    return list(usb.core.find(find_all=True, custom_match=is_usbtmc_device))
+    if dev.idVendor == 0x1334:
+        # Advantest
+        return True
+
+    if dev.idVendor == 0x0957 and dev.idProduct in (0x2818, 0x4218, 0x4418):
+        # Agilent U27xx modular devices in firmware update mode
+        # 0x2818 for U2701A/U2702A (firmware update mode on power up)
+        # 0x4218 for U2722A (firmware update mode on power up)
+        # 0x4418 for U2723A (firmware update mode on power up)
+        return True
+
+    for cfg in dev:
+        if usb.util.find_descriptor(cfg, bInterfaceClass=USBTMC_bInterfaceClass,
+                                    bInterfaceSubClass=USBTMC_bInterfaceSubClass) is not None:
+            return True
+
+    return False
 
 
 def list_resources():
@@ -171,11 +308,7 @@ def list_resources():
             idProduct = 0x4318
 
         # attempt to read serial number
-        iSerial = None
-        try:
-            iSerial = dev.serial_number
-        except:
-            pass
+        iSerial = _read_serial_number(dev)
 
         # append formatted resource string to list
         if iSerial is None:
@@ -186,55 +319,59 @@ def list_resources():
     return res
 
 
-def find_device(idVendor=None, idProduct=None, iSerial=None):
+def find_device(idVendor=None, idProduct=None, iSerial=None, force_refresh=False):
     "Find USBTMC instrument"
 
-    devs = list_devices()
-
-    if len(devs) == 0:
-        return None
-
-    for dev in devs:
-        # match VID and PID
-        found = dev.idVendor == idVendor and dev.idProduct == idProduct
+    # acceptable product IDs; also accept the firmware update mode
+    # product ID for Agilent devices that re-enumerate after boot
+    idProducts = set([idProduct])
 
-        if idVendor == 0x0957 and idProduct == 0x2918:
+    if idVendor == 0x0957:
+        if idProduct == 0x2918:
             # Agilent U2701A/U2702A firmware update mode
-            if dev.idVendor == idVendor and dev.idProduct == 0x2818:
-                found = True
-        
-        if idVendor == 0x0957 and idProduct == 0x4118:
+            idProducts.add(0x2818)
+        elif idProduct == 0x4118:
             # Agilent U2722A firmware update mode
-            if dev.idVendor == idVendor and dev.idProduct == 0x4218:
-                found = True
-
-        if idVendor == 0x0957 and idProduct == 0x4318:
+            idProducts.add(0x4218)
+        elif idProduct == 0x4318:
             # Agilent U2723A firmware update mode
-            if dev.idVendor == idVendor and dev.idProduct == 0x4418:
-                found = True
+            idProducts.add(0x4418)
 
-        if not found:
+    for dev in list_devices(force_refresh):
+        # match VID and PID before any descriptor probing
+        if dev.idVendor != idVendor or dev.idProduct not in idProducts:
             continue
 
         if iSerial is None:
             return dev
-        else:
-            s = ''
-
-            # try reading serial number
-            try:
-                s = dev.serial_number
-            except:
-                pass
-
-            if iSerial == s:
-                return dev
+        elif iSerial == _read_serial_number(dev):
+            return dev
 
     return None
 
 
 class Instrument(object):
     "USBTMC instrument interface client"
+
+    __slots__ = (
+        'idVendor', 'idProduct', 'iSerial', 'device', 'cfg', 'iface',
+        '_term_char', '_term_char_byte', '_term_char_seen',
+        'bcdUSBTMC', 'support_pulse', 'support_talk_only',
+        'support_listen_only', 'support_term_char',
+        'bcdUSB488', 'support_USB4882', 'support_remote_local',
+        'support_trigger', 'support_scpi', 'support_SR', 'support_RL',
+        'support_DT',
+        'max_transfer_size',
+        '_timeout', '_timeout_ms',
+        'bulk_in_ep', 'bulk_out_ep', 'interrupt_in_ep',
+        'last_btag', 'last_rstb_btag',
+        '_read_buf', '_write_buf', '_in_req_hdr', '_status_bufs',
+        '_bulk_out_write', '_bulk_in_read',
+        'connected', 'reattach', 'old_cfg',
+        'advantest_quirk', 'advantest_locked', '_advantest_myid',
+        'rigol_quirk', 'rigol_quirk_ieee_block',
+    )
+
     def __init__(self, *args, **kwargs):
         "Create new USBTMC instrument object"
         self.idVendor = 0
@@ -271,6 +408,15 @@ class Instrument(object):
         self.last_btag = 0
         self.last_rstb_btag = 0
 
+        self._read_buf = None
+        self._write_buf = None
+        self._in_req_hdr = bytearray(USBTMC_HEADER_SIZE)
+        self._status_bufs = {}
+        self._term_char_seen = False
+
+        self._bulk_out_write = None
+        self._bulk_in_read = None
+
         self.connected = False
         self.reattach = []
         self.old_cfg = None
@@ -278,6 +424,7 @@ class Instrument(object):
         # quirks
         self.advantest_quirk = False
         self.advantest_locked = False
+        self._advantest_myid = None
 
         self.rigol_quirk = False
         self.rigol_quirk_ieee_block = False
@@ -286,32 +433,24 @@ class Instrument(object):
 
         # process arguments
         if len(args) == 1:
-            if type(args[0]) == str:
+            if isinstance(args[0], str):
                 resource = args[0]
             else:
                 self.device = args[0]
-        if len(args) >= 2:
+        elif len(args) >= 2:
             self.idVendor = args[0]
             self.idProduct = args[1]
-        if len(args) >= 3:
-            self.iSerial = args[2]
+            if len(args) >= 3:
+                self.iSerial = args[2]
 
         for op in kwargs:
             val = kwargs[op]
-            if op == 'idVendor':
-                self.idVendor = val
-            elif op == 'idProduct':
-                self.idProduct = val
-            elif op == 'iSerial':
-                self.iSerial = val
-            elif op == 'device':
-                self.device = val
-            elif op == 'dev':
-                self.device = val
-            elif op == 'term_char':
-                self.term_char = val
-            elif op == 'resource':
+            if op == 'resource':
                 resource = val
+            elif op in _init_kwarg_attrs:
+                setattr(self, _init_kwarg_attrs[op], val)
+            else:
+                raise TypeError("__init__() got an unexpected keyword argument '%s'" % op)
 
         if resource is not None:
             res = parse_visa_resource_string(resource)
@@ -348,6 +487,23 @@ class Instrument(object):
         self._timeout = val
         self._timeout_ms = int(val * 1000)
 
+    @property
+    def term_char(self):
+        return self._term_char
+
+    @term_char.setter
+    def term_char(self, val):
+        # coerce to a single byte value once, not on every packed header
+        self._term_char = val
+        if val is None:
+            self._term_char_byte = None
+        elif isinstance(val, int):
+            self._term_char_byte = val & 0xFF
+        elif isinstance(val, (bytes, bytearray)):
+            self._term_char_byte = bytearray(val)[0]
+        else:
+            self._term_char_byte = ord(str(val)[0])
+
     def open(self):
         if self.connected:
             return
@@ -368,61 +524,59 @@ class Instrument(object):
  
             serial = self.device.serial_number
 
-            new_id = 0
-
             if self.device.idProduct == 0x2818:
                 # U2701A/U2702A
                 new_id = 0x2918
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047E, data_or_wLength=0x0001)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047D, data_or_wLength=0x0006)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x0484, data_or_wLength=0x0005)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x0472, data_or_wLength=0x000C)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047A, data_or_wLength=0x0001)
-                self.device.ctrl_transfer(bmRequestType=0x40, bRequest=0x0C, wValue=0x0000, wIndex=0x0475, data_or_wLength=b'\x00\x00\x01\x01\x00\x00\x08\x01')
-
-            if self.device.idProduct in [0x4218, 0x4418]:
-                # U2722A/U2723A
-                if self.device.idProduct == 0x4218:
-                    # U2722A
-                    new_id = 0x4118
-                elif self.device.idProduct == 0x4418:
-                    # U2723A
-                    new_id = 0x4318
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047E, data_or_wLength=0x0001)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047D, data_or_wLength=0x0006)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x0487, data_or_wLength=0x0005)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x0472, data_or_wLength=0x000C)
-                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=0x047A, data_or_wLength=0x0001)
-                self.device.ctrl_transfer(bmRequestType=0x40, bRequest=0x0C, wValue=0x0000, wIndex=0x0475, data_or_wLength=b'\x00\x00\x01\x01\x00\x00\x08\x01')
+                seq = _u27xx_init_2818
+            elif self.device.idProduct == 0x4218:
+                # U2722A
+                new_id = 0x4118
+                seq = _u27xx_init_4x18
+            else:
+                # U2723A
+                new_id = 0x4318
+                seq = _u27xx_init_4x18
+
+            for wIndex, wLength in seq:
+                self.device.ctrl_transfer(bmRequestType=0xC0, bRequest=0x0C, wValue=0x0000, wIndex=wIndex, data_or_wLength=wLength)
+            self.device.ctrl_transfer(bmRequestType=0x40, bRequest=0x0C, wValue=0x0000, wIndex=0x0475, data_or_wLength=b'\x00\x00\x01\x01\x00\x00\x08\x01')
 
             usb.util.dispose_resources(self.device)
             self.device = None
 
-            for i in range(40):
-                self.device = find_device(0x0957, new_id, serial)
+            # the boot-mode device just went away, so the cached scan is
+            # stale; drop it before polling for the re-enumerated device
+            _device_list_cache['devs'] = None
+
+            # the device re-enumerates after the firmware handoff; poll
+            # with a short initial delay and exponential backoff instead
+            # of half a second per attempt so fast firmware shows up in
+            # tens of milliseconds
+            delay = 0.01
+            total = 0.0
+            while total < 20.0:
+                self.device = find_device(0x0957, new_id, serial, force_refresh=True)
                 if self.device is not None:
                     break
-                time.sleep(0.5)
+                time.sleep(delay)
+                total += delay
+                delay = min(delay * 2, 0.5)
 
             if self.device is None:
-                print("Agilent U27xx modular device initialization failed")
+                _logger.error("Agilent U27xx modular device initialization failed")
 
         # find first USBTMC interface
         for cfg in self.device:
-            for iface in cfg:
-                if (iface.bInterfaceClass == USBTMC_bInterfaceClass and
-                    iface.bInterfaceSubClass == USBTMC_bInterfaceSubClass):
-                    # USBTMC device
-                    self.cfg = cfg
-                    self.iface = iface
-                    break
-                elif (self.device.idVendor == 0x1334):
-                    # Advantest
-                    self.cfg = cfg
-                    self.iface = iface
-                    break
-                else:
-                    continue
+            if self.device.idVendor == 0x1334:
+                # Advantest
+                iface = usb.util.find_descriptor(cfg)
+            else:
+                iface = usb.util.find_descriptor(cfg,
+                        bInterfaceClass=USBTMC_bInterfaceClass,
+                        bInterfaceSubClass=USBTMC_bInterfaceSubClass)
+            if iface is not None:
+                self.cfg = cfg
+                self.iface = iface
             break
 
         if self.iface is None:
@@ -456,22 +610,21 @@ class Instrument(object):
         # don't need to set altsetting - USBTMC devices have 1 altsetting as per the spec
 
         # find endpoints
-        for ep in self.iface:
-            ep_dir = usb.util.endpoint_direction(ep.bEndpointAddress)
-            ep_type = usb.util.endpoint_type(ep.bmAttributes)
-
-            if (ep_type == usb.util.ENDPOINT_TYPE_BULK):
-                if (ep_dir == usb.util.ENDPOINT_IN):
-                    self.bulk_in_ep = ep
-                elif (ep_dir == usb.util.ENDPOINT_OUT):
-                    self.bulk_out_ep = ep
-            elif (ep_type == usb.util.ENDPOINT_TYPE_INTR):
-                if (ep_dir == usb.util.ENDPOINT_IN):
-                    self.interrupt_in_ep = ep
+        self.bulk_in_ep = usb.util.find_descriptor(self.iface,
+                custom_match=_endpoint_matcher(usb.util.ENDPOINT_IN, usb.util.ENDPOINT_TYPE_BULK))
+        self.bulk_out_ep = usb.util.find_descriptor(self.iface,
+                custom_match=_endpoint_matcher(usb.util.ENDPOINT_OUT, usb.util.ENDPOINT_TYPE_BULK))
+        self.interrupt_in_ep = usb.util.find_descriptor(self.iface,
+                custom_match=_endpoint_matcher(usb.util.ENDPOINT_IN, usb.util.ENDPOINT_TYPE_INTR))
 
         if self.bulk_in_ep is None or self.bulk_out_ep is None:
             raise UsbtmcException("Invalid endpoint configuration", 'init')
 
+        # bind the bulk transfer methods once so the hot paths skip the
+        # endpoint wrapper attribute lookups on every transfer
+        self._bulk_out_write = self.bulk_out_ep.write
+        self._bulk_in_read = self.bulk_in_ep.read
+
         # set quirk flags if necessary
         if self.device.idVendor == 0x1334:
             # Advantest/ADCMT devices have a very odd USBTMC implementation
@@ -513,6 +666,11 @@ class Instrument(object):
 
         self.reattach = []
 
+        self._advantest_myid = None
+        # the lockout state does not survive a close; force the vendor
+        # command to be re-sent after the next open
+        self.advantest_locked = False
+
         self.connected = False
 
     def is_usb488(self):
@@ -523,29 +681,39 @@ class Instrument(object):
         if not self.connected:
             self.open()
 
-        b = self.device.ctrl_transfer(
-              usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE),
-              USBTMC_REQUEST_GET_CAPABILITIES,
-              0x0000,
-              self.iface.index,
-              0x0018,
-              timeout=self._timeout_ms)
+        key = _device_key(self.device)
+
+        b = _capabilities_cache.get(key)
+
+        if b is None:
+            b = self.device.ctrl_transfer(
+                  _bmreq_in_class_interface,
+                  USBTMC_REQUEST_GET_CAPABILITIES,
+                  0x0000,
+                  self.iface.index,
+                  0x0018,
+                  timeout=self._timeout_ms)
+
         if (b[0] == USBTMC_STATUS_SUCCESS):
-            self.bcdUSBTMC = (b[3] << 8) + b[2]
-            self.support_pulse = b[4] & 4 != 0
-            self.support_talk_only = b[4] & 2 != 0
-            self.support_listen_only = b[4] & 1 != 0
-            self.support_term_char = b[5] & 1 != 0
+            _capabilities_cache[key] = b
+            (status, bcdUSBTMC, ifcap, devcap,
+                bcdUSB488, usb488_ifcap, usb488_devcap) = _capabilities_response.unpack_from(b)
+
+            self.bcdUSBTMC = bcdUSBTMC
+            self.support_pulse = ifcap & 4 != 0
+            self.support_talk_only = ifcap & 2 != 0
+            self.support_listen_only = ifcap & 1 != 0
+            self.support_term_char = devcap & 1 != 0
 
             if self.is_usb488():
-                self.bcdUSB488 = (b[13] << 8) + b[12]
-                self.support_USB4882 = b[4] & 4 != 0
-                self.support_remote_local = b[4] & 2 != 0
-                self.support_trigger = b[4] & 1 != 0
-                self.support_scpi = b[4] & 8 != 0
-                self.support_SR = b[4] & 4 != 0
-                self.support_RL = b[4] & 2 != 0
-                self.support_DT = b[4] & 1 != 0
+                self.bcdUSB488 = bcdUSB488
+                self.support_USB4882 = usb488_ifcap & 4 != 0
+                self.support_remote_local = usb488_ifcap & 2 != 0
+                self.support_trigger = usb488_ifcap & 1 != 0
+                self.support_scpi = usb488_devcap & 8 != 0
+                self.support_SR = usb488_devcap & 4 != 0
+                self.support_RL = usb488_devcap & 2 != 0
+                self.support_DT = usb488_devcap & 1 != 0
         else:
             raise UsbtmcException("Get capabilities failed", 'get_capabilities')
 
@@ -559,7 +727,7 @@ class Instrument(object):
 
         if self.support_pulse:
             b = self.device.ctrl_transfer(
-                  usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE),
+                  _bmreq_in_class_interface,
                   USBTMC_REQUEST_INDICATOR_PULSE,
                   0x0000,
                   self.iface.index,
@@ -569,43 +737,50 @@ class Instrument(object):
                 raise UsbtmcException("Pulse failed", 'pulse')
 
     # message header management
-    def pack_bulk_out_header(self, msgid):
+    def _next_btag(self):
         self.last_btag = btag = (self.last_btag % 255) + 1
-        return struct.pack('BBBx', msgid, btag, ~btag & 0xFF)
+        return btag
+
+    def pack_bulk_out_header(self, msgid):
+        return _pack_bulk_out_header(msgid, self._next_btag())
 
     def pack_dev_dep_msg_out_header(self, transfer_size, eom = True):
-        hdr = self.pack_bulk_out_header(USBTMC_MSGID_DEV_DEP_MSG_OUT)
-        return hdr+struct.pack("<LBxxx", transfer_size, eom)
+        btag = self._next_btag()
+        return _dev_dep_msg_out_header.pack(USBTMC_MSGID_DEV_DEP_MSG_OUT,
+                btag, ~btag & 0xFF, transfer_size, eom)
 
     def pack_dev_dep_msg_in_header(self, transfer_size, term_char = None):
-        hdr = self.pack_bulk_out_header(USBTMC_MSGID_DEV_DEP_MSG_IN)
+        btag = self._next_btag()
         transfer_attributes = 0
         if term_char is None:
             term_char = 0
         else:
             transfer_attributes = 2
-            term_char = self.term_char
-        return hdr+struct.pack("<LBBxx", transfer_size, transfer_attributes, term_char)
+            term_char = self._term_char_byte
+        return _dev_dep_msg_in_header.pack(USBTMC_MSGID_DEV_DEP_MSG_IN,
+                btag, ~btag & 0xFF, transfer_size, transfer_attributes, term_char)
 
     def pack_vendor_specific_out_header(self, transfer_size):
-        hdr = self.pack_bulk_out_header(USBTMC_MSGID_VENDOR_SPECIFIC_OUT)
-        return hdr+struct.pack("<Lxxxx", transfer_size)
+        btag = self._next_btag()
+        return _vendor_specific_header.pack(USBTMC_MSGID_VENDOR_SPECIFIC_OUT,
+                btag, ~btag & 0xFF, transfer_size)
 
     def pack_vendor_specific_in_header(self, transfer_size):
-        hdr = self.pack_bulk_out_header(USBTMC_MSGID_VENDOR_SPECIFIC_IN)
-        return hdr+struct.pack("<Lxxxx", transfer_size)
+        btag = self._next_btag()
+        return _vendor_specific_header.pack(USBTMC_MSGID_VENDOR_SPECIFIC_IN,
+                btag, ~btag & 0xFF, transfer_size)
 
     def pack_usb488_trigger(self):
         hdr = self.pack_bulk_out_header(USB488_MSGID_TRIGGER)
         return hdr+b'\x00'*8
 
     def unpack_bulk_in_header(self, data):
-        msgid, btag, btaginverse = struct.unpack_from('BBBx', data)
+        msgid, btag, btaginverse = _bulk_out_header.unpack_from(data)
         return (msgid, btag, btaginverse)
 
     def unpack_dev_dep_resp_header(self, data):
-        msgid, btag, btaginverse = self.unpack_bulk_in_header(data)
-        transfer_size, transfer_attributes = struct.unpack_from('<LBxxx', data, 4)
+        msgid, btag, btaginverse, transfer_size, transfer_attributes = \
+            _dev_dep_resp_header.unpack_from(data)
         data = data[USBTMC_HEADER_SIZE:transfer_size+USBTMC_HEADER_SIZE]
         return (msgid, btag, btaginverse, transfer_size, transfer_attributes, data)
 
@@ -615,30 +790,85 @@ class Instrument(object):
         if not self.connected:
             self.open()
 
-        eom = False
-
         num = len(data)
 
-        offset = 0
+        if num == 0:
+            return
 
-        try:
-            while num > 0:
-                if num <= self.max_transfer_size:
-                    eom = True
+        if num <= self.max_transfer_size:
+            # fast path for the common single-chunk message; no chunk
+            # bookkeeping, one header pack and one payload copy
+            pad = _pad_len[num & 3]
+            buf_size = USBTMC_HEADER_SIZE + num + pad
 
-                block = data[offset:offset+self.max_transfer_size]
-                size = len(block)
+            if self._write_buf is None or len(self._write_buf) < buf_size:
+                self._write_buf = bytearray(buf_size)
 
-                req = self.pack_dev_dep_msg_out_header(size, eom) + block + b'\0'*((4 - (size % 4)) % 4)
-                self.bulk_out_ep.write(req, timeout=self._timeout_ms)
+            buf = self._write_buf
+
+            btag = self._next_btag()
+            _dev_dep_msg_out_header.pack_into(buf, 0,
+                USBTMC_MSGID_DEV_DEP_MSG_OUT, btag, ~btag & 0xFF, num, True)
+            buf[USBTMC_HEADER_SIZE:USBTMC_HEADER_SIZE+num] = data
+            if pad:
+                # zero the alignment bytes; the buffer may hold stale data
+                buf[USBTMC_HEADER_SIZE+num:buf_size] = _pad_bytes[num & 3]
+        else:
+            # split the message into chunks of at most max_transfer_size;
+            # each DEV_DEP_MSG_OUT header must start its own bulk transfer
+            # (USBTMC 1.0 section 3.2), so every chunk gets its own endpoint
+            # write, assembled in a preallocated buffer reused across chunks
+            max_size = self.max_transfer_size
+            buf_size = USBTMC_HEADER_SIZE + max_size + _pad_len[max_size & 3]
+
+            # reuse one outgoing buffer across calls, growing it as needed
+            if self._write_buf is None or len(self._write_buf) < buf_size:
+                self._write_buf = bytearray(buf_size)
+
+            buf = self._write_buf
+            buf_view = memoryview(buf)
+
+            offset = 0
+            pack_header = _dev_dep_msg_out_header.pack_into
+            bulk_out_write = self._bulk_out_write
+            timeout_ms = self._timeout_ms
+            # slice the payload through a memoryview so each chunk is copied
+            # straight into the output buffer without an intermediate bytes
+            src = memoryview(data)
+            while num > 0:
+                size = min(num, max_size)
+                btag = self._next_btag()
+                pack_header(buf, 0,
+                    USBTMC_MSGID_DEV_DEP_MSG_OUT, btag, ~btag & 0xFF, size, size == num)
+                buf[USBTMC_HEADER_SIZE:USBTMC_HEADER_SIZE+size] = src[offset:offset+size]
+                pos = USBTMC_HEADER_SIZE + size
+                pad = _pad_len[size & 3]
+                if pad:
+                    # zero the alignment bytes; the buffer may hold stale data
+                    buf[pos:pos+pad] = _pad_bytes[size & 3]
+
+                try:
+                    bulk_out_write(buf_view[:pos+pad], timeout=timeout_ms)
+                except usb.core.USBError:
+                    exc = sys.exc_info()[1]
+                    if exc.errno == 110:
+                        # timeout, abort the transfer we just sent
+                        self._abort_bulk_out(btag)
+                    raise
 
                 offset += size
                 num -= size
+
+            return
+
+        try:
+            self._bulk_out_write(memoryview(buf)[:buf_size], timeout=self._timeout_ms)
         except usb.core.USBError:
             exc = sys.exc_info()[1]
             if exc.errno == 110:
-                # timeout, abort transfer
-                self._abort_bulk_out()
+                # timeout, abort the transfer we just sent; btag still holds
+                # the tag of the header packed into the buffer
+                self._abort_bulk_out(btag)
             raise
 
     def read_raw(self, num=-1):
@@ -653,58 +883,100 @@ class Instrument(object):
 
         eom = False
 
-        term_char = None
-
-        if self.term_char is not None:
-            term_char = self.term_char
-
-        read_data = b''
+        # the request attributes and term char byte are fixed for the
+        # whole read; only the btag and size change between requests
+        if self.term_char is None:
+            req_attributes = 0
+            req_term_char = 0
+        else:
+            req_attributes = 2
+            req_term_char = self._term_char_byte
+
+        # accumulate into a bytearray; appending to one is amortized O(1)
+        # instead of the O(N^2) copying of bytes concatenation
+        read_data = bytearray()
+
+        self._term_char_seen = False
+
+        # reuse one receive buffer across chunks so each read does not
+        # allocate a fresh array of max_transfer_size bytes
+        buf_size = self.max_transfer_size+USBTMC_HEADER_SIZE+3
+        if self._read_buf is None or len(self._read_buf) < buf_size:
+            self._read_buf = array.array('B', bytearray(buf_size))
+
+        # bind loop-invariant attributes to locals; small-packet devices
+        # (Advantest reads are capped at 63 bytes) run this loop
+        # thousands of times per transfer
+        timeout_ms = self._timeout_ms
+        bulk_out_write = self._bulk_out_write
+        bulk_in_read = self._bulk_in_read
+        in_req_hdr = self._in_req_hdr
+        read_buf = self._read_buf
+        rigol_quirk = self.rigol_quirk
+        pack_req = _dev_dep_msg_in_header.pack_into
+        unpack_resp = self.unpack_dev_dep_resp_header
+
+        # track the btag of the request in flight and which endpoint it is
+        # pending on, so a timeout aborts the right transfer with the right
+        # tag instead of whatever last_btag happens to hold by then
+        sent_btag = self.last_btag
+        out_pending = False
 
         try:
             while not eom:
-                if not self.rigol_quirk or read_data == b'':
+                if not rigol_quirk or not read_data:
 
                     # if the rigol sees this again, it will restart the transfer
                     # so only send it the first time
 
-                    req = self.pack_dev_dep_msg_in_header(read_len, term_char)
-                    self.bulk_out_ep.write(req, timeout=self._timeout_ms)
+                    btag = self._next_btag()
+                    sent_btag = btag
+                    pack_req(in_req_hdr, 0,
+                        USBTMC_MSGID_DEV_DEP_MSG_IN, btag, ~btag & 0xFF,
+                        read_len, req_attributes, req_term_char)
+                    out_pending = True
+                    bulk_out_write(in_req_hdr, timeout=timeout_ms)
+                    out_pending = False
 
-                resp = self.bulk_in_ep.read(read_len+USBTMC_HEADER_SIZE+3, timeout=self._timeout_ms)
+                count = bulk_in_read(read_buf, timeout=timeout_ms)
 
-                if sys.version_info >= (3, 2):
-                    resp = resp.tobytes()
-                else:
-                    resp = resp.tostring()
+                # a memoryview of the receive buffer; the chunk is copied
+                # out when it is appended to read_data, never before
+                resp = memoryview(read_buf)[:count]
 
-                if self.rigol_quirk and read_data:
+                if rigol_quirk and read_data:
                     pass # do nothing, the packet has no header if it isn't the first
                 else:
-                    msgid, btag, btaginverse, transfer_size, transfer_attributes, data = self.unpack_dev_dep_resp_header(resp) 
+                    msgid, btag, btaginverse, transfer_size, transfer_attributes, data = unpack_resp(resp)
 
 
-                if self.rigol_quirk:
+                if rigol_quirk:
                     # rigol devices only send the header in the first packet, and they lie about whether the transaction is complete
                     if read_data:
                         read_data += resp
                     else:
-                        if self.rigol_quirk_ieee_block and data.startswith(b"#"):
+                        head = bytes(data[:12])
+
+                        if self.rigol_quirk_ieee_block and head.startswith(b"#"):
 
                             # ieee block incoming, the transfer_size usbtmc header is lying about the transaction size
-                            l = int(chr(data[1]))
-                            n = int(data[2:l+2])
+                            l = int(chr(head[1]))
+                            n = int(head[2:l+2])
 
                             transfer_size = n + (l+2)  # account for ieee header
 
                         read_data += data
 
                     if len(read_data) >= transfer_size:
-                        read_data = read_data[:transfer_size]  # as per usbtmc spec section 3.2 note 2
+                        del read_data[transfer_size:]  # as per usbtmc spec section 3.2 note 2
                         eom = True
                     else:
                         eom = False
                 else:
                     eom = transfer_attributes & 1
+                    if transfer_attributes & 2:
+                        # transfer ended on the requested term char
+                        self._term_char_seen = True
                     read_data += data
 
                 # Advantest devices never signal EOI and may only send one read packet
@@ -720,11 +992,16 @@ class Instrument(object):
         except usb.core.USBError:
             exc = sys.exc_info()[1]
             if exc.errno == 110:
-                # timeout, abort transfer
-                self._abort_bulk_in()
+                if out_pending:
+                    # the request header itself stalled; the OUT endpoint
+                    # holds the incomplete transfer, not the IN endpoint
+                    self._abort_bulk_out(sent_btag)
+                else:
+                    # timeout, abort transfer
+                    self._abort_bulk_in(sent_btag)
             raise
 
-        return read_data
+        return bytes(read_data)
 
     def ask_raw(self, data, num=-1):
         "Write then read binary data"
@@ -739,28 +1016,46 @@ class Instrument(object):
             if self.advantest_quirk and not was_locked:
                 self.unlock()
 
-    def write(self, message, encoding='utf-8'):
+    def write(self, message, encoding='utf-8', batch=True):
         "Write string to instrument"
-        if type(message) is tuple or type(message) is list:
-            # recursive call for a list of commands
-            for message_i in message:
-                self.write(message_i, encoding)
-            return
+        if isinstance(message, (tuple, list)):
+            if batch:
+                # SCPI permits multiple commands in one message separated
+                # by semicolons, so send the whole list as one transfer
+                # instead of paying a bulk transaction per command
+                message = ';'.join(str(message_i) for message_i in message)
+            else:
+                # separate transaction for each command
+                self.write_many(message, encoding)
+                return
 
         self.write_raw(str(message).encode(encoding))
 
+    def write_many(self, messages, encoding='utf-8'):
+        "Write a sequence of strings to instrument, one transaction each"
+        if not self.connected:
+            self.open()
+
+        write_raw = self.write_raw
+        for message in messages:
+            write_raw(str(message).encode(encoding))
+
     def read(self, num=-1, encoding='utf-8'):
         "Read string from instrument"
-        return self.read_raw(num).decode(encoding).rstrip('\r\n')
+        # strip the terminator from the bytes before decoding so the
+        # decoded string does not have to be reallocated by rstrip
+        data = self.read_raw(num)
+        if self._term_char_seen and self._term_char_byte == 10:
+            # device reported stopping on the newline terminator, so it
+            # is known to be the last byte; drop it and any carriage
+            # return ahead of it without scanning for other terminators
+            return data[:-1].rstrip(b'\r').decode(encoding)
+        return data.rstrip(b'\r\n').decode(encoding)
 
     def ask(self, message, num=-1, encoding='utf-8'):
         "Write then read string"
-        if type(message) is tuple or type(message) is list:
-            # recursive call for a list of commands
-            val = list()
-            for message_i in message:
-                val.append(self.ask(message_i, num, encoding))
-            return val
+        if isinstance(message, (tuple, list)):
+            return self.ask_many(message, num, encoding)
 
         # Advantest/ADCMT hardware won't respond to a command unless it's in Local Lockout mode
         was_locked = self.advantest_locked
@@ -773,6 +1068,22 @@ class Instrument(object):
             if self.advantest_quirk and not was_locked:
                 self.unlock()
 
+    def ask_many(self, messages, num=-1, encoding='utf-8'):
+        "Write then read each string in a sequence"
+        # Advantest/ADCMT hardware won't respond to a command unless it's in Local Lockout mode
+        was_locked = self.advantest_locked
+        try:
+            if self.advantest_quirk and not was_locked:
+                self.lock()
+            val = list()
+            for message in messages:
+                self.write(message, encoding)
+                val.append(self.read(num, encoding))
+            return val
+        finally:
+            if self.advantest_quirk and not was_locked:
+                self.unlock()
+
     def read_stb(self):
         "Read status byte"
 
@@ -786,7 +1097,7 @@ class Instrument(object):
             self.last_rstb_btag = rstb_btag
 
             b = self.device.ctrl_transfer(
-                bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE),
+                bmRequestType=_bmreq_in_class_interface,
                 bRequest=USB488_READ_STATUS_BYTE,
                 wValue=rstb_btag,
                 wIndex=self.iface.index,
@@ -820,7 +1131,7 @@ class Instrument(object):
 
         if self.support_trigger:
             data = self.pack_usb488_trigger()
-            print(repr(data))
+            _logger.debug("trigger packet: %r", data)
             self.bulk_out_ep.write(data, timeout=self._timeout_ms)
         else:
             self.write("*TRG")
@@ -833,7 +1144,7 @@ class Instrument(object):
 
         # Send INITIATE_CLEAR
         b = self.device.ctrl_transfer(
-            bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE),
+            bmRequestType=_bmreq_in_class_interface,
             bRequest=USBTMC_REQUEST_INITIATE_CLEAR,
             wValue=0x0000,
             wIndex=self.iface.index,
@@ -842,24 +1153,49 @@ class Instrument(object):
         )
         if (b[0] == USBTMC_STATUS_SUCCESS):
             # Initiate clear succeeded, wait for completion
-            while True:
-                # Check status
-                b = self.device.ctrl_transfer(
-                    bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE),
-                    bRequest=USBTMC_REQUEST_CHECK_CLEAR_STATUS,
-                    wValue=0x0000,
-                    wIndex=self.iface.index,
-                    data_or_wLength=0x0002,
-                    timeout=self._timeout_ms
-                )
-                time.sleep(0.1)
-                if (b[0] != USBTMC_STATUS_PENDING):
-                    break
+            self._poll_status(USBTMC_REQUEST_CHECK_CLEAR_STATUS,
+                    _bmreq_in_class_interface, self.iface.index, 0x0002)
             # Clear halt condition
             self.bulk_out_ep.clear_halt()
         else:
             raise UsbtmcException("Clear failed", 'clear')
 
+    def _poll_status(self, bRequest, bmRequestType, wIndex, wLength):
+        "Poll a CHECK_*_STATUS request until the device leaves the PENDING state"
+
+        # the first check goes out immediately; most devices finish fast,
+        # so back off from a very short sleep instead of a fixed 100 ms
+        delay = 0.0002
+
+        # reuse one receive buffer per status length; pyusb fills a passed
+        # array in place instead of allocating a fresh one on every poll
+        b = self._status_bufs.get(wLength)
+        if b is None:
+            b = self._status_bufs[wLength] = array.array('B', bytearray(wLength))
+
+        # every argument is invariant across iterations, so freeze the call
+        # once instead of rebuilding the kwargs dict on each poll
+        check = functools.partial(
+            self.device.ctrl_transfer,
+            bmRequestType=bmRequestType,
+            bRequest=bRequest,
+            wValue=0x0000,
+            wIndex=wIndex,
+            data_or_wLength=b,
+            timeout=self._timeout_ms
+        )
+        sleep = time.sleep
+        deadline = _monotonic() + self._timeout
+
+        while True:
+            check()
+            if (b[0] != USBTMC_STATUS_PENDING):
+                return b
+            if _monotonic() >= deadline:
+                raise UsbtmcException("Status check timed out", 'timeout')
+            sleep(delay)
+            delay = min(delay * 2, 0.005)
+
     def _abort_bulk_out(self, btag=None):
         "Abort bulk out"
 
@@ -871,7 +1207,7 @@ class Instrument(object):
 
         # Send INITIATE_ABORT_BULK_OUT
         b = self.device.ctrl_transfer(
-            bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_ENDPOINT),
+            bmRequestType=_bmreq_in_class_endpoint,
             bRequest=USBTMC_REQUEST_INITIATE_ABORT_BULK_OUT,
             wValue=btag,
             wIndex=self.bulk_out_ep.bEndpointAddress,
@@ -880,19 +1216,8 @@ class Instrument(object):
         )
         if (b[0] == USBTMC_STATUS_SUCCESS):
             # Initiate abort bulk out succeeded, wait for completion
-            while True:
-                # Check status
-                b = self.device.ctrl_transfer(
-                    bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_ENDPOINT),
-                    bRequest=USBTMC_REQUEST_CHECK_ABORT_BULK_OUT_STATUS,
-                    wValue=0x0000,
-                    wIndex=self.bulk_out_ep.bEndpointAddress,
-                    data_or_wLength=0x0008,
-                    timeout=self._timeout_ms
-                )
-                time.sleep(0.1)
-                if (b[0] != USBTMC_STATUS_PENDING):
-                    break
+            self._poll_status(USBTMC_REQUEST_CHECK_ABORT_BULK_OUT_STATUS,
+                    _bmreq_in_class_endpoint, self.bulk_out_ep.bEndpointAddress, 0x0008)
         else:
             # no transfer in progress; nothing to do
             pass
@@ -908,7 +1233,7 @@ class Instrument(object):
 
         # Send INITIATE_ABORT_BULK_IN
         b = self.device.ctrl_transfer(
-            bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_ENDPOINT),
+            bmRequestType=_bmreq_in_class_endpoint,
             bRequest=USBTMC_REQUEST_INITIATE_ABORT_BULK_IN,
             wValue=btag,
             wIndex=self.bulk_in_ep.bEndpointAddress,
@@ -916,20 +1241,22 @@ class Instrument(object):
             timeout=self._timeout_ms
         )
         if (b[0] == USBTMC_STATUS_SUCCESS):
-            # Initiate abort bulk in succeeded, wait for completion
-            while True:
-                # Check status
-                b = self.device.ctrl_transfer(
-                    bmRequestType=usb.util.build_request_type(usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_ENDPOINT),
-                    bRequest=USBTMC_REQUEST_CHECK_ABORT_BULK_IN_STATUS,
-                    wValue=0x0000,
-                    wIndex=self.bulk_in_ep.bEndpointAddress,
-                    data_or_wLength=0x0008,
-                    timeout=self._timeout_ms
-                )
-                time.sleep(0.1)
-                if (b[0] != USBTMC_STATUS_PENDING):
+            # drain the aborted transfer until a short packet is seen
+            # (USBTMC 4.2.1.4), bounded by the instrument timeout
+            mps = self.bulk_in_ep.wMaxPacketSize
+            drain_buf = array.array('B', bytearray(mps))
+            deadline = _monotonic() + self._timeout
+            while _monotonic() < deadline:
+                try:
+                    count = self.bulk_in_ep.read(drain_buf, timeout=self._timeout_ms)
+                except usb.core.USBError:
+                    break
+                if count < mps:
                     break
+
+            # Initiate abort bulk in succeeded, wait for completion
+            self._poll_status(USBTMC_REQUEST_CHECK_ABORT_BULK_IN_STATUS,
+                    _bmreq_in_class_endpoint, self.bulk_in_ep.bEndpointAddress, 0x0008)
         else:
             # no transfer in progress; nothing to do
             pass
@@ -949,10 +1276,15 @@ class Instrument(object):
             self.open()
 
         if self.advantest_quirk:
+            if self.advantest_locked:
+                # already locked; skip the vendor control transfer
+                return
             # This Advantest/ADCMT vendor-specific control command enables remote control and must be sent before any commands are exchanged
             # (otherwise READ commands will only retrieve the latest measurement)
-            self.advantest_locked = True
             self.device.ctrl_transfer(bmRequestType=0xA1, bRequest=0xA0, wValue=0x0001, wIndex=0x0000, data_or_wLength=1)
+            # record the state only once the transfer went through, so a
+            # failed lock is retried on the next call
+            self.advantest_locked = True
         else:
             raise NotImplementedError()
 
@@ -963,10 +1295,15 @@ class Instrument(object):
             self.open()
 
         if self.advantest_quirk:
+            if not self.advantest_locked:
+                # already unlocked; skip the vendor control transfer
+                return
             # This Advantest/ADCMT vendor-specific control command enables remote control and must be sent before any commands are exchanged
             # (otherwise READ commands will only retrieve the latest measurement)
-            self.advantest_locked = False
             self.device.ctrl_transfer(bmRequestType=0xA1, bRequest=0xA0, wValue=0x0000, wIndex=0x0000, data_or_wLength=1)
+            # record the state only once the transfer went through, so a
+            # failed unlock is retried on the next call
+            self.advantest_locked = False
         else:
             raise NotImplementedError()
 
@@ -977,21 +1314,30 @@ class Instrument(object):
 
         "Read MyID value from Advantest and ADCMT devices"
         if self.advantest_quirk:
+            # the identifier is fixed for a device, so only hit the wire once
+            if self._advantest_myid is not None:
+                return self._advantest_myid
             # This Advantest/ADCMT vendor-specific control command reads the "MyID" identifier
             try:
-                return int(self.device.ctrl_transfer(bmRequestType=0xC1, bRequest=0xF5, wValue=0x0000, wIndex=0x0000, data_or_wLength=1)[0])
-            except:
+                self._advantest_myid = int(self.device.ctrl_transfer(bmRequestType=0xC1, bRequest=0xF5, wValue=0x0000, wIndex=0x0000, data_or_wLength=1)[0])
+            except usb.core.USBError:
                 return None
+            return self._advantest_myid
         else:
             raise NotImplementedError()
 
     def _release_kernel_driver(self, interface_number):
-        if os.name == 'posix':
-            if self.device.is_kernel_driver_active(interface_number):
+        if _os_is_posix:
+            try:
+                active = self.device.is_kernel_driver_active(interface_number)
+            except NotImplementedError:
+                # backend does not support kernel driver queries
+                return
+            if active:
                 self.reattach.append(interface_number)
                 try:
                     self.device.detach_kernel_driver(interface_number)
                 except usb.core.USBError as e:
-                    sys.exit(
-                        "Could not detach kernel driver from interface({0}): {1}".format(interface_number,
-                                                                                         str(e)))
+                    raise UsbtmcException(
+                        "Could not detach kernel driver from interface(%d): %s" % (interface_number, str(e)),
+                        'detach')